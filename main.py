@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 
 from flask import Flask, render_template, request
-import psycopg2
+from flask_caching import Cache
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from dotenv import load_dotenv
 import os
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from contextlib import contextmanager
+from functools import lru_cache
+import atexit
+import hashlib
 import logging
+import math
 
 # Load environment variables
 load_dotenv()
@@ -15,220 +24,266 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December')
+
+# Palette the category colors are picked from
+CATEGORY_COLORS = ('#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
+                   '#FF9F40', '#8AC27A', '#E763B5', '#FFC107', '#663399')
+
+# Bulk updates/deletes send record IDs in chunks of this size
+RECORD_ID_CHUNK_SIZE = 1000
+
+# Cache for read-mostly aggregates (SimpleCache is per process; use Redis to share between workers)
+cache = Cache(app, config={
+    'CACHE_TYPE': os.getenv('CACHE_TYPE', 'SimpleCache'),
+    'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL')
+})
+
 # Helper function to generate category colors (for templates)
+@lru_cache(maxsize=512)
 def get_category_color(category):
     """Generate consistent color for categories"""
-    colors = [
-        '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', 
-        '#FF9F40', '#8AC27A', '#E763B5', '#FFC107', '#663399'
-    ]
+    # Stable hash of the category name (computed in C, unlike a per-character loop)
+    hash_value = int.from_bytes(hashlib.blake2b(category.encode('utf-8'), digest_size=4).digest(), 'little')
     
-    # Simple hash function to get consistent color
-    hash_value = 0
-    for char in category:
-        hash_value = ord(char) + ((hash_value << 5) - hash_value)
-    
-    index = abs(hash_value) % len(colors)
-    return colors[index]
+    index = hash_value % len(CATEGORY_COLORS)
+    return CATEGORY_COLORS[index]
 
 # Register the function as a template global
 app.jinja_env.globals['get_category_color'] = get_category_color
+app.jinja_env.globals['MONTH_NAMES'] = MONTH_NAMES
+
+# Spending by category over a [start, end) date range. The SQL text never changes,
+# so each pooled connection prepares it once and reuses the plan.
+SPENDING_BY_CATEGORY_QUERY = """
+    SELECT 
+        COALESCE(category, 'Uncategorized') as category,
+        COALESCE(SUM(amount), 0)::float as amount
+    FROM processed_records 
+    WHERE transaction_date >= %s AND transaction_date < %s
+    GROUP BY category
+    ORDER BY amount DESC
+"""
+
+SPENDING_BY_CATEGORY_FILTERED_QUERY = """
+    SELECT 
+        COALESCE(category, 'Uncategorized') as category,
+        COALESCE(SUM(amount), 0)::float as amount
+    FROM processed_records 
+    WHERE transaction_date >= %s AND transaction_date < %s AND category = %s
+    GROUP BY category
+    ORDER BY amount DESC
+"""
 
-def get_db_connection():
-    conn = psycopg2.connect(
+# Process-wide connection pool, so requests don't pay a full connect per hit
+POOL = ConnectionPool(
+    make_conninfo(
         host=os.getenv('DB_HOST'),
         port=os.getenv('DB_PORT'),
-        database=os.getenv('DB_NAME'),
+        dbname=os.getenv('DB_NAME'),
         user=os.getenv('DB_USER'),
         password=os.getenv('DB_PASSWORD')
-    )
-    return conn
+    ),
+    min_size=2,
+    max_size=20,
+    open=True
+)
+atexit.register(POOL.close)
 
-def get_monthly_yearly_balances():
-    """Get monthly and yearly balance information"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get monthly balances (positive = income, negative = expenses)
-        monthly_query = """
+@contextmanager
+def get_conn():
+    """Borrow a connection from the pool and always hand it back"""
+    # Leaving the block commits the transaction (or rolls it back if the block raised),
+    # then the connection goes back to the pool
+    with POOL.connection() as conn:
+        yield conn
+
+@cache.memoize(timeout=60, args_to_ignore=['conn'])
+def get_monthly_yearly_balances(conn, monthly_offset, yearly_offset, per_page):
+    """Get one page of monthly and yearly balances, plus the total number of each"""
+    # Errors propagate to the caller, so a failed query is never memoized
+    cursor = conn.cursor(row_factory=dict_row)
+
+    # Read the requested page of monthly and yearly balances from the summary tables
+    # (see migrations/002_balance_summary_tables.sql) in one round trip
+    balances_query = """
+        (
             SELECT 
-                EXTRACT(YEAR FROM transaction_date) as year,
-                EXTRACT(MONTH FROM transaction_date) as month,
-                SUM(amount) as total_amount,
+                year,
+                month,
+                total::float as amount,
                 CASE 
-                    WHEN SUM(amount) > 0 THEN 'positive'
-                    WHEN SUM(amount) < 0 THEN 'negative'
+                    WHEN total > 0 THEN 'positive'
+                    WHEN total < 0 THEN 'negative'
                     ELSE 'zero'
-                END as balance_status
-            FROM processed_records 
-            GROUP BY EXTRACT(YEAR FROM transaction_date), EXTRACT(MONTH FROM transaction_date)
+                END as status,
+                false as is_yearly,
+                COUNT(*) OVER () as total_count
+            FROM monthly_balances 
             ORDER BY year DESC, month DESC
-        """
-        
-        cursor.execute(monthly_query)
-        monthly_balances = cursor.fetchall()
-        
-        # Get yearly balances
-        yearly_query = """
+            LIMIT %(per_page)s OFFSET %(monthly_offset)s
+        )
+        UNION ALL
+        (
             SELECT 
-                EXTRACT(YEAR FROM transaction_date) as year,
-                SUM(amount) as total_amount,
+                year,
+                NULL as month,
+                total::float as amount,
                 CASE 
-                    WHEN SUM(amount) > 0 THEN 'positive'
-                    WHEN SUM(amount) < 0 THEN 'negative'
+                    WHEN total > 0 THEN 'positive'
+                    WHEN total < 0 THEN 'negative'
                     ELSE 'zero'
-                END as balance_status
-            FROM processed_records 
-            GROUP BY EXTRACT(YEAR FROM transaction_date)
+                END as status,
+                true as is_yearly,
+                COUNT(*) OVER () as total_count
+            FROM yearly_balances 
             ORDER BY year DESC
-        """
-        
-        cursor.execute(yearly_query)
-        yearly_balances = cursor.fetchall()
-        
-        # Format monthly data
-        formatted_monthly = []
-        for record in monthly_balances:
-            year = int(record[0])
-            month = int(record[1])
-            amount = float(record[2]) if record[2] is not None else 0.0
-            status = record[3]
-            
-            # Format month name
-            month_names = ['January', 'February', 'March', 'April', 'May', 'June',
-                          'July', 'August', 'September', 'October', 'November', 'December']
-            month_name = month_names[month - 1] if 1 <= month <= 12 else 'Unknown'
-            
-            formatted_monthly.append({
-                'year': year,
-                'month': month,
-                'month_name': month_name,
-                'amount': amount,
-                'status': status
-            })
-        
-        # Format yearly data
-        formatted_yearly = []
-        for record in yearly_balances:
-            year = int(record[0])
-            amount = float(record[1]) if record[1] is not None else 0.0
-            status = record[2]
-            
-            formatted_yearly.append({
-                'year': year,
-                'amount': amount,
-                'status': status
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        return formatted_monthly, formatted_yearly
-        
-    except Exception as e:
-        logging.error(f"Error fetching monthly/yearly balances: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
-        return [], []
+            LIMIT %(per_page)s OFFSET %(yearly_offset)s
+        )
+    """
 
-def get_spending_data(time_period, category_filter=None, start_date=None, end_date=None):
-    """Get spending data by category for specified time period or date range"""
+    cursor.execute(balances_query, {
+        'monthly_offset': monthly_offset,
+        'yearly_offset': yearly_offset,
+        'per_page': per_page
+    })
+
+    # Split the rows back into their monthly and yearly pages
+    monthly_balances = []
+    yearly_balances = []
+    for balance in cursor.fetchall():
+        (yearly_balances if balance['is_yearly'] else monthly_balances).append(balance)
+
+    cursor.close()
+
+    monthly_count = monthly_balances[0]['total_count'] if monthly_balances else 0
+    yearly_count = yearly_balances[0]['total_count'] if yearly_balances else 0
+    
+    return monthly_balances, yearly_balances, monthly_count, yearly_count
+
+def period_range(time_period, today=None):
+    """Return the [start, end) dates covering the current day/week/month/year"""
+    today = today or date.today()
+    if time_period == 'day':
+        return today, today + timedelta(days=1)
+    if time_period == 'week':
+        week_start = today - timedelta(days=today.weekday())
+        return week_start, week_start + timedelta(days=7)
+    if time_period == 'month':
+        month_start = today.replace(day=1)
+        return month_start, (month_start + timedelta(days=32)).replace(day=1)
+    if time_period == 'year':
+        return today.replace(month=1, day=1), today.replace(year=today.year + 1, month=1, day=1)
+    return date.min, date.max  # All records if no filter
+
+def send_spending_query(conn, time_period, category_filter=None, start_date=None, end_date=None):
+    """Send the spending-by-category query for a time period or date range, returning its cursor
+    (None if the custom date range is invalid)"""
     
     # Debug: Log what we're trying to do
-    logging.info(f"Fetching spending data for time period: {time_period}")
-    logging.info(f"Category filter: {category_filter}")
-    logging.info(f"Start date: {start_date}, End date: {end_date}")
+    log.info("Fetching spending data for time period: %s", time_period)
+    log.info("Category filter: %s", category_filter)
+    log.info("Start date: %s, End date: %s", start_date, end_date)
     
-    # Build the date filter - prioritize custom date range
+    # Build the [start, end) date range - prioritize custom date range
     if start_date and end_date:
-        # Custom date range provided
-        date_filter = "transaction_date >= %s AND transaction_date <= %s"
-        params = (start_date, end_date)
+        # Custom date range provided (end date is inclusive)
+        try:
+            range_start = date.fromisoformat(start_date)
+            range_end = date.fromisoformat(end_date) + timedelta(days=1)
+        except ValueError:
+            log.warning("Ignoring invalid date range: %s - %s", start_date, end_date)
+            return None
     else:
         # Use the standard time period logic
-        if time_period == 'day':
-            date_filter = "DATE(transaction_date) = CURRENT_DATE"
-            params = ()
-        elif time_period == 'week':
-            date_filter = "EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM CURRENT_DATE) AND EXTRACT(WEEK FROM transaction_date) = EXTRACT(WEEK FROM CURRENT_DATE)"
-            params = ()
-        elif time_period == 'month':
-            date_filter = "EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM CURRENT_DATE) AND EXTRACT(MONTH FROM transaction_date) = EXTRACT(MONTH FROM CURRENT_DATE)"
-            params = ()
-        elif time_period == 'year':
-            date_filter = "EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM CURRENT_DATE)"
-            params = ()
-        else:
-            date_filter = "1=1"  # All records if no filter
-            params = ()
+        range_start, range_end = period_range(time_period)
     
-    # Build query with optional category filter
+    # Pick the query with or without the category filter
     if category_filter:
-        where_clause = f"WHERE {date_filter} AND category = %s"
-        params = params + (category_filter,)
+        query = SPENDING_BY_CATEGORY_FILTERED_QUERY
+        params = (range_start, range_end, category_filter)
     else:
-        where_clause = f"WHERE {date_filter}"
-    
-    query = """
-        SELECT 
-            COALESCE(category, 'Uncategorized') as category,
-            SUM(amount) as total_amount
-        FROM processed_records 
-        """ + where_clause + """
-        GROUP BY category
-        ORDER BY total_amount DESC
-    """
+        query = SPENDING_BY_CATEGORY_QUERY
+        params = (range_start, range_end)
     
     # Log the actual query being executed
-    logging.debug(f"Executing SQL Query: {query}")
-    logging.debug(f"Query Parameters: {params}")
+    log.debug("Executing SQL Query: %s", query)
+    log.debug("Query Parameters: %s", params)
+    
+    cursor = conn.cursor(row_factory=dict_row)
+    cursor.execute(query, params, prepare=True)
+    return cursor
+
+def fetch_spending_data(cursor):
+    """Read the spending rows sent by send_spending_query, plus their total"""
+    # Rows already carry the category/amount keys the template reads
+    spending_data = cursor.fetchall()
+    log.debug("Query returned %d records", len(spending_data))
+    
+    total_spending = math.fsum(item['amount'] for item in spending_data)
+    
+    log.info("Total spending calculated: %s", total_spending)
+    log.info("Spending data items: %d", len(spending_data))
+    
+    cursor.close()
     
+    return spending_data, total_spending
+
+def get_spending_data(time_period, category_filter=None, start_date=None, end_date=None):
+    """Get spending data by category on a connection of its own, or nothing if the query fails"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        
-        # Debug: Check how many rows are returned
-        records = cursor.fetchall()
-        logging.debug(f"Query returned {len(records)} records")
-        
-        # Format the results
-        spending_data = []
-        total_spending = 0
-        
-        for record in records:
-            try:
-                category = str(record[0]) if record[0] is not None else 'Uncategorized'
-                amount = float(record[1]) if record[1] is not None else 0.0
-                spending_data.append({
-                    'category': category,
-                    'amount': amount
-                })
-                total_spending += amount
-            except Exception as e:
-                logging.error(f"Error processing record {record}: {str(e)}")
-                continue
-            
-        logging.info(f"Total spending calculated: {total_spending}")
-        logging.info(f"Spending data items: {len(spending_data)}")
-        
-        cursor.close()
-        conn.close()
-        
-        return spending_data, total_spending
-        
+        with get_conn() as conn:
+            cursor = send_spending_query(conn, time_period, category_filter, start_date, end_date)
+            return fetch_spending_data(cursor) if cursor is not None else ([], 0)
     except Exception as e:
-        logging.error(f"Error fetching spending data: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fetching spending data: %s", e)
         return [], 0
 
+def get_balances_page(monthly_offset, yearly_offset, per_page):
+    """Get a page of monthly and yearly balances on a connection of its own, or nothing if the query fails"""
+    try:
+        with get_conn() as conn:
+            return get_monthly_yearly_balances(conn, monthly_offset, yearly_offset, per_page)
+    except Exception as e:
+        log.exception("Error fetching monthly/yearly balances: %s", e)
+        return [], [], 0, 0
+
+@cache.memoize(timeout=300)
+def get_categories():
+    """Get the distinct categories used for the filter dropdown"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        category_query = "SELECT DISTINCT category FROM processed_records WHERE category IS NOT NULL ORDER BY category"
+        cursor.execute(category_query)
+        categories = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    
+    return categories
+
+def parse_keyset_date(value):
+    """Parse the after_date of a "next" link; None (OFFSET paging) if it's missing or mangled"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        log.warning("Ignoring invalid keyset date: %s", value)
+        return None
+
+def chunk_record_ids(record_ids):
+    """Split record IDs into lists of at most RECORD_ID_CHUNK_SIZE"""
+    return [record_ids[i:i + RECORD_ID_CHUNK_SIZE] for i in range(0, len(record_ids), RECORD_ID_CHUNK_SIZE)]
+
+def invalidate_cached_aggregates():
+    """Drop cached aggregates after processed_records has been modified"""
+    cache.delete_memoized(get_monthly_yearly_balances)
+    cache.delete_memoized(get_categories)
+
 @app.route('/')
 def index():
     # Get filter parameters
@@ -239,12 +294,6 @@ def index():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    # Get spending data for the specified period
-    spending_data, total_spending = get_spending_data(time_period, category_filter, start_date, end_date)
-    
-    # Get monthly and yearly balances
-    monthly_balances, yearly_balances = get_monthly_yearly_balances()
-    
     # Pagination for balances - default to 10 items per page
     monthly_page = request.args.get('monthly_page', 1, type=int)
     yearly_page = request.args.get('yearly_page', 1, type=int)
@@ -262,13 +311,28 @@ def index():
     monthly_offset = (monthly_page - 1) * per_page
     yearly_offset = (yearly_page - 1) * per_page
     
-    # Paginate monthly balances
-    paginated_monthly = monthly_balances[monthly_offset:monthly_offset + per_page]
-    monthly_total_pages = (len(monthly_balances) + per_page - 1) // per_page
+    try:
+        # Pipelined, so on a balances cache miss the spending and balances queries
+        # share a single round trip
+        with get_conn() as conn, conn.pipeline():
+            # Send the spending data query for the specified period
+            spending_cursor = send_spending_query(conn, time_period, category_filter, start_date, end_date)
+            
+            # Get the requested page of monthly and yearly balances
+            balances = get_monthly_yearly_balances(conn, monthly_offset, yearly_offset, per_page)
+            
+            spending = fetch_spending_data(spending_cursor) if spending_cursor is not None else ([], 0)
+    except Exception as e:
+        # A failed statement aborts the rest of the pipeline, so fetch each result set on its
+        # own; only the one that actually fails comes back empty
+        log.warning("Pipelined dashboard fetch failed, retrying separately: %s", e)
+        spending = get_spending_data(time_period, category_filter, start_date, end_date)
+        balances = get_balances_page(monthly_offset, yearly_offset, per_page)
     
-    # Paginate yearly balances
-    paginated_yearly = yearly_balances[yearly_offset:yearly_offset + per_page]
-    yearly_total_pages = (len(yearly_balances) + per_page - 1) // per_page
+    spending_data, total_spending = spending
+    paginated_monthly, paginated_yearly, monthly_count, yearly_count = balances
+    monthly_total_pages = (monthly_count + per_page - 1) // per_page
+    yearly_total_pages = (yearly_count + per_page - 1) // per_page
     
     return render_template('index.html', 
                          spending_data=spending_data,
@@ -291,6 +355,12 @@ def admin():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
+    # Keyset cursor (last row of the previous page) and the total counted on the first page,
+    # both set by the "next" link
+    after_date = parse_keyset_date(request.args.get('after_date'))
+    after_id = request.args.get('after_id', type=int)
+    known_total = request.args.get('total_count', type=int)
+    
     # Validate pagination parameters
     if page < 1:
         page = 1
@@ -301,33 +371,41 @@ def admin():
     offset = (page - 1) * per_page
     
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Query to get unprocessed financial records using your actual table structure
-        query = """
-            SELECT id, record_id_bank, transaction_date, currency_date, account, description, amount, currency
-            FROM unprocessed_records 
-            ORDER BY transaction_date DESC
-            LIMIT %s OFFSET %s
-        """
-        
-        cursor.execute(query, (per_page, offset))
-        records = cursor.fetchall()
+        # Borrow a connection from the pool
+        with get_conn() as conn:
+            cursor = conn.cursor(row_factory=dict_row)
+        
+            # Query to get unprocessed financial records using your actual table structure
+            query = """
+                SELECT id, record_id_bank, transaction_date, currency_date, account, description, amount, currency
+            """
+        
+            # Seek past the previous page when we have its last row, otherwise fall back to OFFSET.
+            # Only the OFFSET path counts rows (in the same pass); a keyset page reuses the carried
+            # total, so it reads no further than the page itself.
+            use_keyset = page > 1 and after_date and after_id is not None and known_total is not None
+            if use_keyset:
+                query += " FROM unprocessed_records WHERE (transaction_date, id) < (%s, %s) ORDER BY transaction_date DESC, id DESC LIMIT %s"
+                params = (after_date, after_id, per_page)
+            else:
+                query += ", COUNT(*) OVER () AS total_count FROM unprocessed_records ORDER BY transaction_date DESC, id DESC LIMIT %s OFFSET %s"
+                params = (per_page, offset)
+        
+            cursor.execute(query, params)
+            
+            # A page is at most 100 rows, so read it whole and hand the connection back
+            # before rendering
+            records = cursor.fetchall()
+            cursor.close()
         
-        # Get total count for pagination
-        count_query = "SELECT COUNT(*) FROM unprocessed_records"
-        cursor.execute(count_query)
-        total_count = cursor.fetchone()[0]
+        if use_keyset:
+            total_count = known_total
+        else:
+            total_count = records[0]['total_count'] if records else 0
         
         # Calculate total pages
         total_pages = (total_count + per_page - 1) // per_page
         
-        # Close connections
-        cursor.close()
-        conn.close()
-        
         return render_template('admin.html', 
                              records=records,
                              page=page,
@@ -336,10 +414,7 @@ def admin():
                              total_count=total_count)
                              
     except Exception as e:
-        logging.error(f"Error in admin route: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in admin route: %s", e)
         return f"Error fetching records: {str(e)}", 500
 
 @app.route('/record_transformer')
@@ -356,6 +431,12 @@ def record_transformer():
     sort_by = request.args.get('sort_by', 'transaction_date')
     sort_order = request.args.get('sort_order', 'desc')
     
+    # Keyset cursor (last row of the previous page) and the total counted on the first page,
+    # both set by the "next" link
+    after_date = parse_keyset_date(request.args.get('after_date'))
+    after_id = request.args.get('after_id')
+    known_total = request.args.get('total_count', type=int)
+    
     # Validate pagination parameters
     if page < 1:
         page = 1
@@ -374,67 +455,88 @@ def record_transformer():
     offset = (page - 1) * per_page
     
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Query to get processed financial records with filtering
-        # We need to get categories first for the filter dropdown
-        category_query = "SELECT DISTINCT category FROM processed_records WHERE category IS NOT NULL ORDER BY category"
-        cursor.execute(category_query)
-        categories = [row[0] for row in cursor.fetchall()]
-        
-        # Main query to get records
-        base_query = """
-            SELECT record_id_bank, transaction_date, currency_date, account, description, amount, currency, category
-            FROM processed_records 
-        """
-        
-        params = []
-        where_clauses = []
+        # We need the categories for the filter dropdown
+        categories = get_categories()
         
-        # Add category filter if specified
-        if category_filter:
-            where_clauses.append("category = %s")
-            params.append(category_filter)
+        # Borrow a connection from the pool
+        with get_conn() as conn:
+            cursor = conn.cursor(row_factory=dict_row)
             
-        # Add search filter if specified
-        if search_description:
-            where_clauses.append("description ILIKE %s")
-            params.append(f"%{search_description}%")
-        
-        # Build the complete query
-        if where_clauses:
-            base_query += " WHERE " + " AND ".join(where_clauses)
+            params = []
+            where_clauses = []
+    
+            # Add category filter if specified
+            if category_filter:
+                where_clauses.append(sql.SQL("category = %s"))
+                params.append(category_filter)
+        
+            # Add search filter if specified
+            if search_description:
+                where_clauses.append(sql.SQL("description ILIKE %s"))
+                params.append(f"%{search_description}%")
+    
+            # Seek past the previous page when sorting by date and we have its last row
+            use_keyset = (sort_by == 'transaction_date' and page > 1 and after_date and after_id
+                          and known_total is not None)
+            if use_keyset:
+                where_clauses.append(sql.SQL("(transaction_date, record_id_bank) {op} (%s, %s)").format(
+                    op=sql.SQL("<" if sort_order == 'desc' else ">")))
+                params.extend([after_date, after_id])
+    
+            # Sort column and direction come from the allowlists above
+            direction = sql.SQL(sort_order.upper())
+        
+            # Date sorting is tie-broken on record_id_bank so keyset pages are stable
+            if sort_by == 'transaction_date':
+                order_by = sql.SQL("transaction_date {dir}, record_id_bank {dir}").format(dir=direction)
+            else:
+                order_by = sql.SQL("{col} {dir}").format(col=sql.Identifier(sort_by), dir=direction)
+        
+            if use_keyset:
+                limit = sql.SQL("LIMIT %s")
+                params.append(per_page)
+            else:
+                limit = sql.SQL("LIMIT %s OFFSET %s")
+                params.extend([per_page, offset])
+    
+            # Only the OFFSET path counts rows (in the same pass); a keyset page reuses the carried
+            # total, so it reads no further than the page itself
+            total_column = sql.SQL("") if use_keyset else sql.SQL(", COUNT(*) OVER () AS total_count")
+    
+            # Main query to get records
+            base_query = sql.SQL("""
+                SELECT record_id_bank, transaction_date, currency_date, account, description, amount, currency, category
+                       {total_column}
+                FROM processed_records 
+                {where}
+                ORDER BY {order_by}
+                {limit}
+            """).format(
+                total_column=total_column,
+                where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(where_clauses) if where_clauses else sql.SQL(""),
+                order_by=order_by,
+                limit=limit
+            )
+    
+            cursor.execute(base_query, tuple(params))
             
-        # Add sorting
-        base_query += " ORDER BY " + sort_by + " " + sort_order + " LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
+            # A page is at most 100 rows, so read it whole and hand the connection back
+            # before rendering
+            records = cursor.fetchall()
+            cursor.close()
         
-        cursor.execute(base_query, params)
-        records = cursor.fetchall()
-        
-        # Get total count for pagination
-        count_query = "SELECT COUNT(*) FROM processed_records"
-        
-        # Rebuild the WHERE clause for counting
-        if where_clauses:
-            count_query += " WHERE " + " AND ".join(where_clauses)
-            
-        cursor.execute(count_query, params[:-2] if where_clauses else ())
-        total_count = cursor.fetchone()[0]
+        if use_keyset:
+            total_count = known_total
+        else:
+            total_count = records[0]['total_count'] if records else 0
         
         # Calculate total pages
         total_pages = (total_count + per_page - 1) // per_page
         
-        # Close connections
-        cursor.close()
-        conn.close()
-        
         # Debug: Print records to see what we're getting
-        logging.debug(f"Fetched {len(records)} records from database")
+        log.debug("Fetched %d records from database", len(records))
         if records:
-            logging.debug(f"First record structure: {records[0]}")
+            log.debug("First record structure: %s", records[0])
         
         return render_template('record_transformer.html', 
                              records=records,
@@ -449,10 +551,7 @@ def record_transformer():
                              sort_order=sort_order)
                              
     except Exception as e:
-        logging.error(f"Error in record_transformer: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in record_transformer: %s", e)
         return f"Error fetching records: {str(e)}", 500
 
 @app.route('/update_categories', methods=['POST'])
@@ -471,32 +570,30 @@ def update_categories():
         if not record_ids:
             return "No valid record IDs provided", 400
             
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Update records with new category
-        update_query = """
-            UPDATE processed_records 
-            SET category = %s 
-            WHERE record_id_bank = ANY(%s)
-        """
-        cursor.execute(update_query, (new_category, record_ids))
-        
-        # Commit the changes
-        conn.commit()
-        
-        # Close connections
-        cursor.close()
-        conn.close()
+        # Borrow a connection from the pool
+        with get_conn() as conn:
+            cursor = conn.cursor()
+        
+            # Update records with new category
+            update_query = """
+                UPDATE processed_records 
+                SET category = %s 
+                WHERE record_id_bank = ANY(%s)
+            """
+            cursor.executemany(update_query,
+                               [(new_category, chunk) for chunk in chunk_record_ids(record_ids)])
+        
+            # Commit the changes (all chunks in one transaction)
+            conn.commit()
+            invalidate_cached_aggregates()
+        
+            # Close cursor (the connection goes back to the pool)
+            cursor.close()
         
         return f"Successfully updated {len(record_ids)} records to category '{new_category}'", 200
         
     except Exception as e:
-        logging.error(f"Error updating categories: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error updating categories: %s", e)
         return f"Error updating categories: {str(e)}", 500
 
 @app.route('/delete_records', methods=['POST'])
@@ -514,31 +611,29 @@ def delete_records():
         if not record_ids:
             return "No valid record IDs provided", 400
             
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Borrow a connection from the pool
+        with get_conn() as conn:
+            cursor = conn.cursor()
         
-        # Delete records
-        delete_query = """
-            DELETE FROM processed_records 
-            WHERE record_id_bank = ANY(%s)
-        """
-        cursor.execute(delete_query, (record_ids,))
+            # Delete records
+            delete_query = """
+                DELETE FROM processed_records 
+                WHERE record_id_bank = ANY(%s)
+            """
+            cursor.executemany(delete_query,
+                               [(chunk,) for chunk in chunk_record_ids(record_ids)])
         
-        # Commit the changes
-        conn.commit()
+            # Commit the changes (all chunks in one transaction)
+            conn.commit()
+            invalidate_cached_aggregates()
         
-        # Close connections
-        cursor.close()
-        conn.close()
+            # Close cursor (the connection goes back to the pool)
+            cursor.close()
         
         return f"Successfully deleted {len(record_ids)} records", 200
         
     except Exception as e:
-        logging.error(f"Error deleting records: {str(e)}")
-        logging.debug("Traceback:")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error deleting records: %s", e)
         return f"Error deleting records: {str(e)}", 500
 
 if __name__ == '__main__':
@@ -0,0 +1,8 @@
+-- Indexes backing the dashboard aggregates on processed_records.
+--
+-- The monthly/yearly balances group on the year/month of transaction_date;
+-- this expression index (with amount included) lets Postgres answer them
+-- with an index-only scan instead of a sequential scan of the table.
+CREATE INDEX IF NOT EXISTS processed_records_ym
+    ON processed_records ((EXTRACT(YEAR FROM transaction_date)::int), (EXTRACT(MONTH FROM transaction_date)::int))
+    INCLUDE (amount);
@@ -0,0 +1,128 @@
+-- Monthly/yearly balances for the dashboard.
+--
+-- monthly_balances holds one row per month and is maintained incrementally:
+-- statement-level triggers on processed_records fold the rows each statement
+-- inserted, deleted or updated (read from its transition tables) into the
+-- months they belong to. A write costs work proportional to its own rows, not
+-- a re-aggregation of the whole table, and only locks the month rows it
+-- touches. yearly_balances is a plain view on top, which only ever reads
+-- twelve rows per year.
+--
+-- The script is idempotent and rebuilds monthly_balances from scratch, so it
+-- can be re-run to resync. It runs in one transaction with writers locked
+-- out, so no write slips in between the rebuild and the triggers.
+BEGIN;
+
+LOCK TABLE processed_records IN SHARE ROW EXCLUSIVE MODE;
+
+-- Earlier versions of this script kept materialized views refreshed in full
+-- by a trigger
+DROP TRIGGER IF EXISTS processed_records_refresh_balances ON processed_records;
+DROP TRIGGER IF EXISTS processed_records_refresh_balances_truncate ON processed_records;
+DROP FUNCTION IF EXISTS refresh_balance_views();
+DROP MATERIALIZED VIEW IF EXISTS mv_yearly_balances;
+DROP MATERIALIZED VIEW IF EXISTS mv_monthly_balances;
+
+-- record_count tells when a month has no records left and its row can go
+CREATE TABLE IF NOT EXISTS monthly_balances (
+    year int NOT NULL,
+    month int NOT NULL,
+    total numeric NOT NULL,
+    record_count bigint NOT NULL,
+    PRIMARY KEY (year, month)
+);
+
+CREATE OR REPLACE VIEW yearly_balances AS
+    SELECT year, SUM(total) AS total
+    FROM monthly_balances
+    GROUP BY year;
+
+-- SECURITY DEFINER so writes by the application role can maintain the table
+-- without owning it. search_path is pinned and the table is schema-qualified,
+-- so a caller can't get its own objects run with the owner's privileges.
+CREATE OR REPLACE FUNCTION apply_balance_changes() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path = pg_catalog, public, pg_temp AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM public.monthly_balances;
+        RETURN NULL;
+    END IF;
+
+    -- Net change per month: new rows count positively, old rows negatively.
+    -- Records without a transaction_date don't belong to any month.
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.monthly_balances AS b (year, month, total, record_count)
+        SELECT EXTRACT(YEAR FROM transaction_date)::int, EXTRACT(MONTH FROM transaction_date)::int,
+               COALESCE(SUM(amount), 0), COUNT(*)
+        FROM new_rows
+        WHERE transaction_date IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (year, month) DO UPDATE
+            SET total = b.total + EXCLUDED.total, record_count = b.record_count + EXCLUDED.record_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO public.monthly_balances AS b (year, month, total, record_count)
+        SELECT EXTRACT(YEAR FROM transaction_date)::int, EXTRACT(MONTH FROM transaction_date)::int,
+               -COALESCE(SUM(amount), 0), -COUNT(*)
+        FROM old_rows
+        WHERE transaction_date IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (year, month) DO UPDATE
+            SET total = b.total + EXCLUDED.total, record_count = b.record_count + EXCLUDED.record_count;
+    ELSE
+        -- Months whose totals come out unchanged (e.g. category-only updates) are skipped
+        INSERT INTO public.monthly_balances AS b (year, month, total, record_count)
+        SELECT EXTRACT(YEAR FROM transaction_date)::int, EXTRACT(MONTH FROM transaction_date)::int,
+               COALESCE(SUM(amount), 0), SUM(n)
+        FROM (
+            SELECT transaction_date, amount, 1 AS n FROM new_rows
+            UNION ALL
+            SELECT transaction_date, -amount, -1 FROM old_rows
+        ) changed
+        WHERE transaction_date IS NOT NULL
+        GROUP BY 1, 2
+        HAVING COALESCE(SUM(amount), 0) <> 0 OR SUM(n) <> 0
+        ON CONFLICT (year, month) DO UPDATE
+            SET total = b.total + EXCLUDED.total, record_count = b.record_count + EXCLUDED.record_count;
+    END IF;
+
+    DELETE FROM public.monthly_balances WHERE record_count = 0;
+    RETURN NULL;
+END;
+$$;
+
+-- Transition tables can't be combined with an UPDATE OF column list, so the
+-- update trigger sees every update and skips the ones that don't move money
+DROP TRIGGER IF EXISTS processed_records_balances_insert ON processed_records;
+CREATE TRIGGER processed_records_balances_insert
+    AFTER INSERT ON processed_records
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_balance_changes();
+
+DROP TRIGGER IF EXISTS processed_records_balances_update ON processed_records;
+CREATE TRIGGER processed_records_balances_update
+    AFTER UPDATE ON processed_records
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_balance_changes();
+
+DROP TRIGGER IF EXISTS processed_records_balances_delete ON processed_records;
+CREATE TRIGGER processed_records_balances_delete
+    AFTER DELETE ON processed_records
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_balance_changes();
+
+DROP TRIGGER IF EXISTS processed_records_balances_truncate ON processed_records;
+CREATE TRIGGER processed_records_balances_truncate
+    AFTER TRUNCATE ON processed_records
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_balance_changes();
+
+-- (Re)build the table from the current records
+DELETE FROM monthly_balances;
+INSERT INTO monthly_balances (year, month, total, record_count)
+SELECT EXTRACT(YEAR FROM transaction_date)::int, EXTRACT(MONTH FROM transaction_date)::int,
+       COALESCE(SUM(amount), 0), COUNT(*)
+FROM processed_records
+WHERE transaction_date IS NOT NULL
+GROUP BY 1, 2;
+
+COMMIT;
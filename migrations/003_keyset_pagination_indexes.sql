@@ -0,0 +1,15 @@
+-- Indexes matching the keyset ("seek") pagination used by /admin and
+-- /record_transformer, so every page is an index range scan no matter how
+-- deep it is.
+--
+-- processed_records_tx_date_id also serves the plain transaction_date range
+-- filters of the spending per category query, so it replaces the
+-- single-column processed_records_tx_date index earlier versions of 001
+-- created.
+CREATE INDEX IF NOT EXISTS processed_records_tx_date_id
+    ON processed_records (transaction_date DESC, record_id_bank DESC);
+
+DROP INDEX IF EXISTS processed_records_tx_date;
+
+CREATE INDEX IF NOT EXISTS unprocessed_records_tx_date_id
+    ON unprocessed_records (transaction_date DESC, id DESC);